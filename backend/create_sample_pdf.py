@@ -7,9 +7,8 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 import os
 
-def create_sample_pdf():
+def create_sample_pdf(filename: str = "sample_document.pdf"):
     """Create a sample PDF with test content"""
-    filename = "sample_document.pdf"
     c = canvas.Canvas(filename, pagesize=letter)
     
     # Add title
@@ -3,6 +3,8 @@ Dartos - Agentic Automated Info Services Backend
 FastAPI application for PDF processing, AI analysis, and RAG-based document querying.
 """
 
+import asyncio
+import json
 import logging
 import os
 import re
@@ -12,9 +14,11 @@ from pathlib import Path
 from typing import Optional
 
 from dotenv import load_dotenv
-from fastapi import BackgroundTasks, Depends, FastAPI, File, HTTPException, UploadFile
+from fastapi import BackgroundTasks, Depends, FastAPI, File, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 
@@ -44,6 +48,17 @@ MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 ALLOWED_EXTENSIONS = {'.pdf'}
 UPLOAD_DIR = Path("uploads")
 FRONTEND_BUILD_DIR = Path("frontend/build")
+TERMINAL_STATUSES = {"indexed", "processed", "failed"}
+STATUS_WAIT_MAX = 30  # seconds a status request may long-poll
+STATUS_WAIT_INTERVAL = 0.1  # seconds between database checks while long-polling
+STATUS_EVENTS_MAX = 300  # seconds a status event stream stays open
+STATUS_PROGRESS_MESSAGES = {
+    "uploaded": "Document uploaded, waiting to be processed",
+    "processing": "Extracting text and indexing document",
+    "indexed": "Document fully processed and indexed",
+    "processed": "Document processed (indexing unavailable)",
+    "failed": "Processing failed"
+}
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -98,6 +113,25 @@ def validate_file(file: UploadFile) -> None:
     if file.content_type and not file.content_type.startswith('application/pdf'):
         raise HTTPException(status_code=400, detail="Invalid content type. Must be PDF.")
 
+def _document_status(document: Document) -> DocumentStatus:
+    """Build the status response for a document"""
+    return DocumentStatus(
+        id=document.id,
+        filename=document.filename,
+        status=document.status,
+        progress=STATUS_PROGRESS_MESSAGES.get(document.status, "Unknown status"),
+        error_message=document.error_message
+    )
+
+def _load_document_status(document_id: int) -> Optional[DocumentStatus]:
+    """Read a document's status in a short-lived session so no connection is held between checks"""
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        return _document_status(document) if document else None
+    finally:
+        db.close()
+
 def _validate_extracted_text(text: str) -> dict:
     """Validate the quality of extracted text"""
     if not text or not text.strip():
@@ -299,27 +333,56 @@ async def list_documents(db: Session = Depends(get_db)):
     ]
 
 @app.get("/api/documents/{document_id}/status", response_model=DocumentStatus)
-async def get_document_status(document_id: int, db: Session = Depends(get_db)):
-    """Get processing status of a specific document"""
-    document = db.query(Document).filter(Document.id == document_id).first()
-    if not document:
+async def get_document_status(
+    document_id: int,
+    wait: float = Query(0, ge=0, le=STATUS_WAIT_MAX)
+):
+    """Get processing status of a specific document, long-polling up to `wait` seconds for a change"""
+    # Each check uses its own session in the threadpool, so a waiting request neither
+    # holds a pooled connection nor blocks the event loop on database I/O
+    status = await run_in_threadpool(_load_document_status, document_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Determine progress message based on status
-    progress_messages = {
-        "uploaded": "Document uploaded, waiting to be processed",
-        "processing": "Extracting text and indexing document",
-        "indexed": "Document fully processed and indexed",
-        "processed": "Document processed (indexing unavailable)",
-        "failed": "Processing failed"
-    }
+    initial_status = status.status
+    deadline = time.monotonic() + wait
+    while (status.status == initial_status
+           and status.status not in TERMINAL_STATUSES
+           and time.monotonic() < deadline):
+        await asyncio.sleep(STATUS_WAIT_INTERVAL)
+        status = await run_in_threadpool(_load_document_status, document_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Document not found")
     
-    return DocumentStatus(
-        id=document.id,
-        filename=document.filename,
-        status=document.status,
-        progress=progress_messages.get(document.status, "Unknown status"),
-        error_message=document.error_message
+    return status
+
+@app.get("/api/documents/{document_id}/events")
+async def stream_document_status(document_id: int, request: Request):
+    """Stream status changes of a document as server-sent events until it reaches a terminal status"""
+    # Like the long-poll, every check opens and closes its own session in the threadpool,
+    # so an open stream holds no pooled connection between checks
+    status = await run_in_threadpool(_load_document_status, document_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    async def events():
+        current = status
+        last_status = None
+        deadline = time.monotonic() + STATUS_EVENTS_MAX
+        while current is not None and time.monotonic() < deadline and not await request.is_disconnected():
+            if current.status != last_status:
+                last_status = current.status
+                payload = json.dumps(jsonable_encoder(current))
+                yield f"event: status\ndata: {payload}\n\n"
+                if last_status in TERMINAL_STATUSES:
+                    break
+            await asyncio.sleep(STATUS_WAIT_INTERVAL)
+            current = await run_in_threadpool(_load_document_status, document_id)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @app.post("/api/process", response_model=SummaryResponse)
@@ -335,7 +398,8 @@ async def process_document(
         relevant_chunks = []
         if rag_service:
             try:
-                relevant_chunks = rag_service.search(request.query, k=request.top_k)
+                # Embedding and reranking block, so keep them off the event loop
+                relevant_chunks = await run_in_threadpool(rag_service.search, request.query, k=request.top_k)
                 logger.info(f"RAG search returned {len(relevant_chunks)} chunks")
             except Exception as e:
                 logger.error(f"RAG search failed: {e}", exc_info=True)
@@ -424,6 +488,11 @@ async def log_frontend(log_entry: LogEntry):
     
     return {"status": "logged"}
 
+@app.api_route("/api/healthz", methods=["GET", "HEAD"])
+async def healthz():
+    """Liveness probe that touches neither the database nor the services"""
+    return {"status": "ok"}
+
 # Catch-all routes for SPA - MUST be defined last
 @app.get("/")
 async def root():
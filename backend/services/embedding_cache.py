@@ -0,0 +1,147 @@
+try:
+    import h5py
+    H5PY_AVAILABLE = True
+except ImportError:
+    H5PY_AVAILABLE = False
+import numpy as np
+import sqlite3
+import threading
+import time
+import math
+import logging
+from typing import Callable, Dict, List
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_BATCH_SIZE = 500
+
+class EmbeddingCache:
+    """Bounded on-disk embedding cache keyed by content hash.
+
+    Vectors live in a float16 HDF5 dataset of at most max_entries rows; a SQLite
+    sidecar maps each hash to its row and last-used time. When the dataset is full
+    the least recently used evict_fraction of entries is dropped and their rows reused.
+    clock supplies the last-used timestamps.
+    """
+
+    def __init__(self, path: str, dim: int, max_entries: int = 2_000_000, evict_fraction: float = 0.01,
+                 clock: Callable[[], float] = time.time):
+        if not H5PY_AVAILABLE:
+            raise RuntimeError("h5py is required for the embedding cache")
+        self.dim = dim
+        self.max_entries = max_entries
+        self.evict_count = max(1, math.ceil(max_entries * evict_fraction))
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self._file = h5py.File(f"{path}.h5", "a")
+        if "vecs" not in self._file:
+            self._file.create_dataset(
+                "vecs",
+                shape=(0, dim),
+                maxshape=(max_entries, dim),
+                dtype="float16",
+                chunks=(min(1024, max_entries), dim)
+            )
+        self._vecs = self._file["vecs"]
+
+        self._db = sqlite3.connect(f"{path}.sqlite", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(hash TEXT PRIMARY KEY, row INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY)")
+        self._db.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached float32 vectors for the keys that are present"""
+        if not keys:
+            return {}
+        with self._lock:
+            rows = {}
+            for i in range(0, len(keys), SQLITE_BATCH_SIZE):
+                batch = keys[i:i + SQLITE_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(self._db.execute(
+                    f"SELECT hash, row FROM entries WHERE hash IN ({placeholders})", batch
+                ))
+            if not rows:
+                return {}
+
+            # h5py fancy indexing needs increasing row numbers
+            sorted_rows = sorted(set(rows.values()))
+            vecs = self._vecs[sorted_rows].astype(np.float32)
+            position = {row: i for i, row in enumerate(sorted_rows)}
+
+            now = self._clock()
+            self._db.executemany(
+                "UPDATE entries SET last_used = ? WHERE hash = ?",
+                [(now, key) for key in rows]
+            )
+            self._db.commit()
+            return {key: vecs[position[row]] for key, row in rows.items()}
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Store vectors for new keys, evicting least recently used entries when full"""
+        with self._lock:
+            existing = set()
+            keys = list(items)
+            for i in range(0, len(keys), SQLITE_BATCH_SIZE):
+                batch = keys[i:i + SQLITE_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                existing.update(key for (key,) in self._db.execute(
+                    f"SELECT hash FROM entries WHERE hash IN ({placeholders})", batch
+                ))
+            new_keys = [key for key in keys if key not in existing][-self.max_entries:]
+            if not new_keys:
+                return
+
+            rows = self._allocate_rows(len(new_keys))
+            order = sorted(range(len(rows)), key=rows.__getitem__)
+            sorted_rows = [rows[i] for i in order]
+            self._vecs[sorted_rows] = np.asarray(
+                [items[new_keys[i]] for i in order], dtype=np.float16
+            )
+
+            now = self._clock()
+            self._db.executemany(
+                "INSERT INTO entries (hash, row, last_used) VALUES (?, ?, ?)",
+                [(key, row, now) for key, row in zip(new_keys, rows)]
+            )
+            self._db.commit()
+
+    def _allocate_rows(self, count: int) -> List[int]:
+        """Take rows from the free list, then grow the dataset, then evict"""
+        rows = [row for (row,) in self._db.execute("SELECT row FROM free_rows LIMIT ?", (count,))]
+        self._db.executemany("DELETE FROM free_rows WHERE row = ?", [(row,) for row in rows])
+
+        size = self._vecs.shape[0]
+        grow = min(count - len(rows), self.max_entries - size)
+        if grow > 0:
+            self._vecs.resize(size + grow, axis=0)
+            rows.extend(range(size, size + grow))
+
+        remaining = count - len(rows)
+        if remaining > 0:
+            evicted = self._db.execute(
+                "SELECT hash, row FROM entries ORDER BY last_used LIMIT ?",
+                (max(remaining, self.evict_count),)
+            ).fetchall()
+            self._db.executemany("DELETE FROM entries WHERE hash = ?", [(key,) for key, _ in evicted])
+            evicted_rows = [row for _, row in evicted]
+            rows.extend(evicted_rows[:remaining])
+            self._db.executemany(
+                "INSERT INTO free_rows (row) VALUES (?)", [(row,) for row in evicted_rows[remaining:]]
+            )
+            logger.info(f"Evicted {len(evicted)} embeddings from cache")
+        return rows
+
+    def close(self):
+        """Flush and close the underlying files"""
+        with self._lock:
+            self._db.close()
+            self._file.close()
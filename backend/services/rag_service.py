@@ -5,51 +5,205 @@ try:
     SENTENCE_TRANSFORMERS_AVAILABLE = True
 except ImportError:
     SENTENCE_TRANSFORMERS_AVAILABLE = False
+try:
+    from flashrank import Ranker, RerankRequest
+    FLASHRANK_AVAILABLE = True
+except ImportError:
+    FLASHRANK_AVAILABLE = False
+from .embedding_cache import EmbeddingCache, H5PY_AVAILABLE
+import numpy as np
+import hashlib
+import os
 import uuid
 from typing import List, Optional
 import re
 import logging
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sentence endings: . ! ? followed by space or newline
+SENTENCE_END_PATTERN = re.compile(r'[.!?]\s')
+
+# Reranking: fetch k * RERANK_CANDIDATE_MULTIPLIER candidates from Chroma and let
+# the cross-encoder pick the top k; fall back to ANN order after RERANK_TIMEOUT seconds.
+# A timed-out rerank can't be interrupted, so reranking is switched off after the first one
+RERANK_MODEL = 'ms-marco-MiniLM-L-12-v2'
+RERANK_CANDIDATE_MULTIPLIER = 4
+RERANK_TIMEOUT = 5.0
+RERANK_MAX_WORKERS = 4
+
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+EMBEDDING_CACHE_MAX_ENTRIES = 2_000_000
+
 class RAGService:
     def __init__(self, chroma_path: str = "./chroma_db", max_retries: int = 3):
         self.chroma_path = chroma_path
         self.max_retries = max_retries
         self.client: Optional[chromadb.PersistentClient] = None
         self.collection = None
-        self.embedding_model = None
+        self._embedding_model = None
+        self._embedding_model_loaded = False
+        self._embedding_model_lock = threading.Lock()
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        self._reranker = None
+        self._reranker_loaded = False
+        self._reranker_lock = threading.Lock()
+        self._rerank_executor: Optional[ThreadPoolExecutor] = None
         self._initialize_chromadb()
-        self._initialize_embedding_model()
     
     def _initialize_chromadb(self):
         """Initialize ChromaDB with error handling"""
         try:
             self.client = chromadb.PersistentClient(path=self.chroma_path)
-            self.collection = self.client.get_or_create_collection(name="documents")
+            # MiniLM embeddings are trained for cosine similarity; HNSW settings only
+            # take effect when the collection is first created
+            self.collection = self.client.get_or_create_collection(
+                name="documents",
+                metadata={
+                    "hnsw:space": "cosine",
+                    "hnsw:M": 32,
+                    "hnsw:construction_ef": 200,
+                    "hnsw:search_ef": 64,
+                }
+            )
             logger.info("ChromaDB initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize ChromaDB: {e}")
             raise RuntimeError(f"ChromaDB initialization failed: {str(e)}")
     
+    @property
+    def embedding_model(self):
+        """Embedding model, loaded on first access"""
+        if not self._embedding_model_loaded:
+            with self._embedding_model_lock:
+                if not self._embedding_model_loaded:
+                    self._initialize_embedding_model()
+                    self._embedding_model_loaded = True
+        return self._embedding_model
+    
     def _initialize_embedding_model(self):
         """Initialize embedding model with error handling"""
         if SENTENCE_TRANSFORMERS_AVAILABLE:
             try:
                 # Try to load the model - it will use cached version if available
                 # or download if not cached and network is available
-                self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+                self._embedding_model = SentenceTransformer(EMBEDDING_MODEL)
                 logger.info("Embedding model loaded successfully")
+                self._initialize_embedding_cache()
             except Exception as e:
                 logger.warning(f"Could not load embedding model: {e}")
                 logger.info("Will use ChromaDB's default embedding function")
-                self.embedding_model = None
+                self._embedding_model = None
         else:
             logger.warning("sentence-transformers not available. Using ChromaDB's default embedding.")
-            self.embedding_model = None
+            self._embedding_model = None
+    
+    def _initialize_embedding_cache(self):
+        """Open the on-disk embedding cache next to the Chroma store"""
+        if not H5PY_AVAILABLE:
+            logger.info("h5py not available. Chunk embeddings will not be cached.")
+            return
+        try:
+            self.embedding_cache = EmbeddingCache(
+                os.path.join(self.chroma_path, "emb_cache"),
+                dim=self._embedding_model.get_sentence_embedding_dimension(),
+                max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+            )
+            logger.info("Embedding cache opened successfully")
+        except Exception as e:
+            logger.warning(f"Could not open embedding cache: {e}")
+            self.embedding_cache = None
+    
+    def _embed_chunks(self, chunks: List[str]) -> Optional[np.ndarray]:
+        """Embed chunks with the local model, reusing cached vectors by content hash"""
+        model = self.embedding_model
+        if model is None:
+            return None
+        
+        keys = [hashlib.sha256(f"{EMBEDDING_MODEL}\0{chunk}".encode('utf-8')).hexdigest() for chunk in chunks]
+        cached = {}
+        if self.embedding_cache:
+            try:
+                cached = self.embedding_cache.get_many(keys)
+            except Exception as e:
+                logger.warning(f"Embedding cache lookup failed: {e}")
+        
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        embeddings = np.empty((len(chunks), model.get_sentence_embedding_dimension()), dtype=np.float32)
+        for i, key in enumerate(keys):
+            if key in cached:
+                embeddings[i] = cached[key]
+        
+        if missing:
+            try:
+                encoded = model.encode([chunks[i] for i in missing], convert_to_numpy=True)
+            except Exception as e:
+                logger.warning(f"Local embedding failed, falling back to ChromaDB's embedding: {e}")
+                return None
+            embeddings[missing] = encoded
+            if self.embedding_cache:
+                try:
+                    self.embedding_cache.put_many({keys[i]: encoded[j] for j, i in enumerate(missing)})
+                except Exception as e:
+                    logger.warning(f"Embedding cache update failed: {e}")
+        
+        logger.info(f"Embedded {len(chunks)} chunks ({len(chunks) - len(missing)} from cache)")
+        return embeddings
+    
+    @property
+    def reranker(self):
+        """Cross-encoder reranker, loaded on first access"""
+        if not self._reranker_loaded:
+            with self._reranker_lock:
+                if not self._reranker_loaded:
+                    self._initialize_reranker()
+                    self._reranker_loaded = True
+        return self._reranker
+    
+    def _initialize_reranker(self):
+        """Initialize cross-encoder reranker with error handling"""
+        if not FLASHRANK_AVAILABLE:
+            logger.info("flashrank not available. Search results will use ChromaDB ranking.")
+            return
+        try:
+            self._reranker = Ranker(model_name=RERANK_MODEL)
+            self._rerank_executor = ThreadPoolExecutor(max_workers=RERANK_MAX_WORKERS)
+            logger.info("Reranker loaded successfully")
+        except Exception as e:
+            logger.warning(f"Could not load reranker: {e}")
+            self._reranker = None
+    
+    def _rerank(self, query: str, chunks: List[str]) -> List[str]:
+        """Reorder chunks by cross-encoder score, keeping the original order on failure"""
+        reranker, executor = self._reranker, self._rerank_executor
+        if reranker is None or executor is None:
+            return chunks
+        passages = [{"id": i, "text": chunk} for i, chunk in enumerate(chunks)]
+        try:
+            future = executor.submit(reranker.rerank, RerankRequest(query=query, passages=passages))
+            ranked = future.result(timeout=RERANK_TIMEOUT)
+            return [chunks[passage["id"]] for passage in ranked]
+        except FuturesTimeoutError:
+            logger.warning(f"Reranking timed out after {RERANK_TIMEOUT}s; disabling reranker")
+            self._disable_reranker()
+            return chunks
+        except Exception as e:
+            logger.warning(f"Reranking failed, using original order: {e}")
+            return chunks
+    
+    def _disable_reranker(self):
+        """Stop reranking and drop queued requests; a rerank already running finishes in the background"""
+        with self._reranker_lock:
+            executor = self._rerank_executor
+            self._reranker = None
+            self._rerank_executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
     
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
         """Split text into overlapping chunks with improved sentence boundary detection"""
@@ -71,14 +225,13 @@ class RAGService:
             # Try to break at sentence boundaries first
             if end < len(text):
                 # Look for sentence endings: . ! ? followed by space or newline
-                sentence_pattern = r'[.!?]\s'
-                matches = list(re.finditer(sentence_pattern, text[start:end]))
+                matches = list(SENTENCE_END_PATTERN.finditer(text, start, end))
                 if matches:
                     # Take the last sentence end that's at least 60% into the chunk
                     min_pos = start + int(chunk_size * 0.6)
                     for match in reversed(matches):
-                        if match.end() + start >= min_pos:
-                            end = match.end() + start
+                        if match.end() >= min_pos:
+                            end = match.end()
                             break
                 
                 # If no good sentence break, try paragraph breaks
@@ -87,9 +240,15 @@ class RAGService:
                     if para_break != -1 and para_break > start + chunk_size // 2:
                         end = para_break + 2  # Include the \n\n
             
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
+            # Trim boundary whitespace by index so each chunk costs a single slice
+            chunk_start = start
+            chunk_end = min(end, len(text))
+            while chunk_start < chunk_end and text[chunk_start].isspace():
+                chunk_start += 1
+            while chunk_end > chunk_start and text[chunk_end - 1].isspace():
+                chunk_end -= 1
+            if chunk_end > chunk_start:
+                chunks.append(text[chunk_start:chunk_end])
             
             # Move start position with overlap
             start = max(start + 1, end - overlap)  # Ensure progress
@@ -115,11 +274,16 @@ class RAGService:
             # Create metadata for each chunk
             metadatas = [{"doc_id": doc_id, "chunk_index": i} for i in range(len(chunks))]
             
+            # Precompute embeddings when the local model is available; otherwise
+            # ChromaDB embeds the documents with its default (same MiniLM) function
+            embeddings = self._embed_chunks(chunks)
+            
             # Add chunks to collection with retries
             for attempt in range(self.max_retries):
                 try:
                     self.collection.add(
                         documents=chunks,
+                        embeddings=embeddings,  # float32 ndarray, no per-element list conversion
                         metadatas=metadatas,
                         ids=chunk_ids
                     )
@@ -144,13 +308,17 @@ class RAGService:
             return []
         
         try:
+            n_results = k * RERANK_CANDIDATE_MULTIPLIER if self.reranker else k
             results = self.collection.query(
                 query_texts=[query],
-                n_results=k
+                n_results=n_results
             )
             
             if results and results.get('documents'):
                 chunks = results['documents'][0]
+                if self.reranker and len(chunks) > 1:
+                    chunks = self._rerank(query, chunks)
+                chunks = chunks[:k]
                 logger.info(f"Search for '{query}' returned {len(chunks)} chunks")
                 return chunks
             else:
@@ -161,6 +329,42 @@ class RAGService:
             logger.error(f"Error searching documents: {e}")
             return []
     
+    def search_batch(self, queries: List[str], k: int = 5) -> List[List[str]]:
+        """Search for several queries with one batched embedding pass and one ChromaDB query"""
+        if not self.collection:
+            logger.error("ChromaDB collection not initialized")
+            return [[] for _ in queries]
+        if not queries:
+            return []
+        
+        try:
+            n_results = k * RERANK_CANDIDATE_MULTIPLIER if self.reranker else k
+            query_embeddings = None
+            model = self.embedding_model
+            if model is not None:
+                try:
+                    query_embeddings = model.encode(queries, batch_size=32, convert_to_numpy=True)
+                except Exception as e:
+                    logger.warning(f"Local query embedding failed, falling back to ChromaDB's embedding: {e}")
+            
+            if query_embeddings is not None:
+                results = self.collection.query(query_embeddings=query_embeddings, n_results=n_results)
+            else:
+                results = self.collection.query(query_texts=queries, n_results=n_results)
+            
+            batches = (results or {}).get('documents') or [[] for _ in queries]
+            all_chunks = []
+            for query, chunks in zip(queries, batches):
+                if self.reranker and len(chunks) > 1:
+                    chunks = self._rerank(query, chunks)
+                all_chunks.append(chunks[:k])
+            logger.info(f"Batch search for {len(queries)} queries returned {sum(map(len, all_chunks))} chunks")
+            return all_chunks
+        
+        except Exception as e:
+            logger.error(f"Error searching documents: {e}")
+            return [[] for _ in queries]
+    
     def delete_document(self, doc_id: int):
         """Delete all chunks for a specific document"""
         if not self.collection:
@@ -188,13 +392,13 @@ class RAGService:
             return []
         
         try:
-            results = self.collection.get(where={"doc_id": doc_id})
+            results = self.collection.get(where={"doc_id": doc_id}, include=["documents"])
             
             if results and results.get('documents'):
-                # Sort by chunk index
-                chunks_with_metadata = list(zip(results['documents'], results.get('metadatas', [])))
-                chunks_with_metadata.sort(key=lambda x: x[1].get('chunk_index', 0) if x[1] else 0)
-                chunks = [chunk for chunk, _ in chunks_with_metadata]
+                # Chunk ids follow doc_{doc_id}_chunk_{i}, so the index is recoverable
+                # without fetching metadatas
+                indices = [int(chunk_id.rsplit('_', 1)[1]) for chunk_id in results['ids']]
+                chunks = [chunk for _, chunk in sorted(zip(indices, results['documents']))]
                 logger.info(f"Retrieved {len(chunks)} chunks for document {doc_id}")
                 return chunks
             else:
@@ -101,7 +101,8 @@ def migrate_database():
 def migrate_sqlite():
     """Migration for SQLite databases (simpler approach)"""
     from database import SessionLocal, engine, Base
-    from models import Document
+    import models  # noqa: F401 - registers the documents table on Base.metadata
+    from sqlalchemy import text
     
     print("🔄 Running SQLite migration...")
     
@@ -110,18 +111,20 @@ def migrate_sqlite():
         print("Creating/updating tables...")
         Base.metadata.create_all(bind=engine)
         
-        # Update existing documents
+        # Update existing documents in two set-based statements
         db = SessionLocal()
         try:
-            documents = db.query(Document).all()
-            for doc in documents:
-                if not doc.status:
-                    if doc.content:
-                        doc.status = 'processed'
-                    else:
-                        doc.status = 'uploaded'
+            processed = db.execute(text("""
+                UPDATE documents SET status = 'processed'
+                WHERE (status IS NULL OR status = '')
+                  AND content IS NOT NULL AND content != ''
+            """))
+            uploaded = db.execute(text("""
+                UPDATE documents SET status = 'uploaded'
+                WHERE status IS NULL OR status = ''
+            """))
             db.commit()
-            print(f"✅ Updated {len(documents)} existing documents")
+            print(f"✅ Updated {processed.rowcount + uploaded.rowcount} existing documents")
         finally:
             db.close()
         
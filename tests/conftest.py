@@ -0,0 +1,53 @@
+"""
+Shared pytest configuration for the Dartos tests
+"""
+
+import contextlib
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+try:
+    from filelock import FileLock
+    FILELOCK_AVAILABLE = True
+except ImportError:
+    FILELOCK_AVAILABLE = False
+
+# Keep the tests off the on-disk database; must be set before database.py is imported
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+
+# Make the backend modules importable once per test process (and per xdist worker)
+backend_dir = Path(__file__).resolve().parent.parent / "backend"
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+# Script-style checks driven by their own main(): test_upload_pipeline needs a running
+# backend, and test_backend/test_basic return pass/fail instead of asserting
+collect_ignore = ["test_upload_pipeline.py", "test_backend.py", "test_basic.py"]
+
+@pytest.fixture(scope="session", autouse=True)
+def backend_modules():
+    """Import the backend modules once per worker before any test runs"""
+    # Tests that need a module without its dependencies installed still fail on their own import
+    for name in ("schemas", "models", "services.llm_service", "services.pdf_processor", "services.rag_service"):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+@pytest.fixture(scope="session")
+def rag_service(pytestconfig):
+    """One RAGService per worker so the embedding model is loaded only once
+
+    The Chroma store lives in the pytest cache, keyed by embedding model, so documents
+    indexed by one run are reused by the next.
+    """
+    from services.rag_service import RAGService, EMBEDDING_MODEL
+    chroma_path = pytestconfig.cache.mkdir(f"chroma-{EMBEDDING_MODEL}")
+
+    # xdist workers share the store; serialize its first-time creation
+    lock = FileLock(f"{chroma_path}.lock") if FILELOCK_AVAILABLE else contextlib.nullcontext()
+    with lock:
+        return RAGService(chroma_path=str(chroma_path))
@@ -4,7 +4,6 @@ Simple test script to verify the backend services work correctly
 """
 
 import sys
-import os
 import tempfile
 from pathlib import Path
 
@@ -41,10 +40,10 @@ def test_rag_service():
     print("Testing RAG Service...")
     try:
         from services.rag_service import RAGService
-        # Create a temporary directory for testing
+        # Create a temporary directory for testing; RAGService takes the path as
+        # an argument rather than reading it from os.environ
         with tempfile.TemporaryDirectory() as temp_dir:
-            os.environ['CHROMA_DB_PATH'] = temp_dir
-            rag = RAGService()
+            rag = RAGService(chroma_path=temp_dir)
             
             # Test basic functionality
             test_text = "This is a test document for RAG functionality."
@@ -65,9 +64,12 @@ def test_database():
     """Test database models"""
     print("Testing Database Models...")
     try:
+        from sqlalchemy import inspect
         from database import Base, engine
         from models import Document
-        Base.metadata.create_all(bind=engine)
+        # One catalog query instead of a CREATE IF NOT EXISTS per table when the schema exists
+        if not inspect(engine).has_table(Document.__tablename__):
+            Base.metadata.create_all(bind=engine)
         print("✅ Database models work correctly")
         return True
     except Exception as e:
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test the bounded on-disk embedding cache (eviction, row reuse, persistence)
+"""
+
+import itertools
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("h5py")
+
+from services.embedding_cache import EmbeddingCache
+
+DIM = 8
+
+def _vec(i):
+    """Distinct vector that float16 stores exactly"""
+    return np.full(DIM, i, dtype=np.float32)
+
+@pytest.fixture
+def clock():
+    """Strictly increasing last_used timestamps so LRU order is deterministic"""
+    ticks = itertools.count()
+    return lambda: next(ticks)
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    """Cache holding 4 entries that evicts 2 at a time"""
+    cache = EmbeddingCache(str(tmp_path / "emb"), dim=DIM, max_entries=4, evict_fraction=0.5, clock=clock)
+    yield cache
+    cache.close()
+
+def _fill(cache, keys):
+    for i, key in enumerate(keys):
+        cache.put_many({key: _vec(i)})
+
+def test_put_evicts_when_full(cache):
+    """A put into a full cache evicts entries instead of growing past max_entries"""
+    _fill(cache, "abcd")
+    cache.put_many({"e": _vec(9)})
+
+    assert cache._vecs.shape[0] == 4
+    assert len(cache.get_many(list("abcde"))) == 3
+    assert "e" in cache.get_many(["e"])
+
+def test_eviction_follows_lru_order(cache):
+    """Entries touched by get_many survive; the least recently used go first"""
+    _fill(cache, "abcd")
+    cache.get_many(["a"])
+    cache.put_many({"e": _vec(9)})
+
+    assert set(cache.get_many(list("abcde"))) == {"a", "d", "e"}
+
+def test_freed_rows_are_reused(cache):
+    """Rows freed by an eviction batch are handed out before evicting again"""
+    _fill(cache, "abcd")
+    cache.put_many({"e": _vec(9)})
+    assert cache._db.execute("SELECT COUNT(*) FROM free_rows").fetchone()[0] == 1
+
+    cache.put_many({"f": _vec(10)})
+
+    assert cache._db.execute("SELECT COUNT(*) FROM free_rows").fetchone()[0] == 0
+    assert set(cache.get_many(list("abcdef"))) == {"c", "d", "e", "f"}
+    rows = [row for (row,) in cache._db.execute("SELECT row FROM entries")]
+    assert sorted(rows) == [0, 1, 2, 3]
+
+def test_values_survive_reopen(tmp_path, clock):
+    """Vectors and their keys are read back after closing and reopening the cache"""
+    path = str(tmp_path / "emb")
+    cache = EmbeddingCache(path, dim=DIM, max_entries=4, evict_fraction=0.5, clock=clock)
+    cache.put_many({"a": _vec(1), "b": _vec(2)})
+    cache.close()
+
+    reopened = EmbeddingCache(path, dim=DIM, max_entries=4, evict_fraction=0.5, clock=clock)
+    try:
+        found = reopened.get_many(["a", "b", "missing"])
+        assert set(found) == {"a", "b"}
+        np.testing.assert_array_equal(found["a"], _vec(1))
+        np.testing.assert_array_equal(found["b"], _vec(2))
+        assert found["a"].dtype == np.float32
+    finally:
+        reopened.close()
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
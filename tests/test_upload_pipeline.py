@@ -7,214 +7,353 @@ Tests: file upload, text extraction, API endpoints, and error handling
 import requests
 import time
 import os
+import json
+import http.client
+from urllib.parse import urlsplit
+import sys
+import logging
+from logging.handlers import MemoryHandler
 from pathlib import Path
+from dataclasses import dataclass
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+try:
+    from requests_toolbelt import MultipartEncoder
+    TOOLBELT_AVAILABLE = True
+except ImportError:
+    TOOLBELT_AVAILABLE = False
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+try:
+    from rich.console import Console
+    from rich.table import Table
+    RICH_AVAILABLE = True
+except ImportError:
+    RICH_AVAILABLE = False
 
 # Configuration
 BACKEND_URL = "http://localhost:8000/api"
 TEST_PDF = "sample_document.pdf"
+TERMINAL_STATUSES = {"indexed", "processed", "failed"}
+STATUS_POLL_WAIT = 5  # seconds the backend may hold each status poll open
+
+# Progress is buffered and written out once per test phase (or immediately on a
+# warning); per-poll status lines are DEBUG and only shown with -v
+_stream_handler = logging.StreamHandler(sys.stdout)
+_stream_handler.setFormatter(logging.Formatter("%(message)s"))
+_buffer = MemoryHandler(capacity=64, flushLevel=logging.WARNING, target=_stream_handler)
+log = logging.getLogger("dartos.test")
+log.addHandler(_buffer)
+log.setLevel(logging.DEBUG if "-v" in sys.argv else logging.INFO)
+log.propagate = False
+
+# Shared session so every call reuses pooled keep-alive connections to the backend
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.1)
+))
+
+@dataclass
+class PipelineState:
+    """Responses shared across the upload -> processing -> retrieval phases"""
+    doc_id: Optional[int] = None
+    status_response: Optional[dict] = None
 
 def test_backend_health():
     """Test if backend is responding"""
-    print("1. Testing backend health...")
+    log.info("1. Testing backend health...")
     try:
-        response = requests.get(f"{BACKEND_URL}/documents")
-        if response.status_code == 200:
-            print("   ✅ Backend is healthy and responding")
+        # HEAD on the liveness endpoint: no body, and a down backend fails within a second
+        response = SESSION.head(f"{BACKEND_URL}/healthz", timeout=(1.0, 2.0), allow_redirects=False)
+        if response.ok or response.status_code == 405:
+            log.info("   ✅ Backend is healthy and responding")
             return True
         else:
-            print(f"   ❌ Backend returned status {response.status_code}")
+            log.error(f"   ❌ Backend returned status {response.status_code}")
             return False
     except Exception as e:
-        print(f"   ❌ Backend is not responding: {e}")
+        log.error(f"   ❌ Backend is not responding: {e}")
         return False
 
-def test_file_upload():
+def test_file_upload(state):
     """Test file upload functionality"""
-    print("\n2. Testing file upload...")
-    
-    if not os.path.exists(TEST_PDF):
-        print(f"   ❌ Test file {TEST_PDF} not found")
-        return None
+    log.info("\n2. Testing file upload...")
     
     try:
         with open(TEST_PDF, 'rb') as f:
-            files = {'file': (TEST_PDF, f, 'application/pdf')}
-            response = requests.post(f"{BACKEND_URL}/upload", files=files)
+            if TOOLBELT_AVAILABLE:
+                # Streams the body from the file instead of building it in memory first
+                encoder = MultipartEncoder(fields={'file': (TEST_PDF, f, 'application/pdf')})
+                response = SESSION.post(
+                    f"{BACKEND_URL}/upload",
+                    data=encoder,
+                    headers={'Content-Type': encoder.content_type},
+                    timeout=(3, 30)
+                )
+            else:
+                files = {'file': (TEST_PDF, f, 'application/pdf')}
+                response = SESSION.post(f"{BACKEND_URL}/upload", files=files, stream=False, timeout=(3, 30))
         
         if response.status_code == 200:
             data = response.json()
-            print(f"   ✅ File uploaded successfully")
-            print(f"   - Document ID: {data['id']}")
-            print(f"   - Filename: {data['filename']}")
-            print(f"   - Status: {data['status']}")
-            return data['id']
+            log.info(f"   ✅ File uploaded successfully")
+            log.info(f"   - Document ID: {data['id']}")
+            log.info(f"   - Filename: {data['filename']}")
+            log.info(f"   - Status: {data['status']}")
+            state.doc_id = data['id']
+            return state.doc_id
         else:
-            print(f"   ❌ Upload failed with status {response.status_code}")
-            print(f"   - Response: {response.text}")
+            log.error(f"   ❌ Upload failed with status {response.status_code}")
+            log.info(f"   - Response: {response.text}")
             return None
+    except FileNotFoundError:
+        log.error(f"   ❌ Test file {TEST_PDF} not found")
+        return None
     except Exception as e:
-        print(f"   ❌ Upload error: {e}")
+        log.error(f"   ❌ Upload error: {e}")
         return None
 
-def test_document_processing(doc_id):
+def _stream_status_events(doc_id, max_wait):
+    """Wait for a terminal status pushed by the events endpoint; None if the stream is unavailable"""
+    if not HTTPX_AVAILABLE:
+        return None
+    
+    try:
+        with httpx.stream("GET", f"{BACKEND_URL}/documents/{doc_id}/events", timeout=max_wait) as response:
+            if response.status_code != 200:
+                return None
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = json.loads(line[len("data:"):])
+                log.debug(f"   Status: {data['status']} - {data.get('progress', '')}")
+                if data['status'] in TERMINAL_STATUSES:
+                    return data
+    except httpx.HTTPError as e:
+        log.debug(f"   Status event stream unavailable, polling instead: {e}")
+    return None
+
+def _report_processing_result(data):
+    """Report a terminal document status"""
+    error = data.get('error_message')
+    if data['status'] == 'failed':
+        log.error(f"   ❌ Processing failed: {error}")
+        return False
+    
+    log.info(f"   ✅ Document processed successfully")
+    if error:
+        log.warning(f"   ⚠️  Warning: {error}")
+    return True
+
+def test_document_processing(state):
     """Test document processing and status tracking"""
-    print(f"\n3. Testing document processing (ID: {doc_id})...")
+    doc_id = state.doc_id
+    log.info(f"\n3. Testing document processing (ID: {doc_id})...")
     
     max_wait = 30  # seconds
-    start_time = time.time()
-    
-    while time.time() - start_time < max_wait:
-        try:
-            response = requests.get(f"{BACKEND_URL}/documents/{doc_id}/status")
-            if response.status_code == 200:
-                data = response.json()
-                status = data['status']
-                progress = data.get('progress', '')
-                error = data.get('error_message')
-                
-                print(f"   Status: {status} - {progress}")
-                
-                if status in ['indexed', 'processed']:
-                    print(f"   ✅ Document processed successfully")
-                    if error:
-                        print(f"   ⚠️  Warning: {error}")
-                    return True
-                elif status == 'failed':
-                    print(f"   ❌ Processing failed: {error}")
+    deadline = time.monotonic_ns() + max_wait * 1_000_000_000
+    
+    # Prefer the pushed status stream; poll only when it is unavailable or ends early
+    data = _stream_status_events(doc_id, max_wait)
+    if data:
+        state.status_response = data
+        return _report_processing_result(data)
+    
+    # One persistent stdlib connection for the poll loop: no cookies, auth or retries are
+    # needed against the local backend. The wait parameter lets the backend hold each
+    # poll open until the status changes, so no client-side sleep is needed
+    backend = urlsplit(BACKEND_URL)
+    status_path = f"{backend.path}/documents/{doc_id}/status?wait={STATUS_POLL_WAIT}"
+    conn = http.client.HTTPConnection(backend.hostname, backend.port or 80, timeout=STATUS_POLL_WAIT + 5)
+    
+    try:
+        while time.monotonic_ns() < deadline:
+            try:
+                conn.request("GET", status_path)
+                response = conn.getresponse()
+                body = response.read()
+                if response.status == 200:
+                    data = orjson.loads(body) if ORJSON_AVAILABLE else json.loads(body)
+                    log.debug(f"   Status: {data['status']} - {data.get('progress', '')}")
+                    
+                    if data['status'] in TERMINAL_STATUSES:
+                        state.status_response = data
+                        return _report_processing_result(data)
+                else:
+                    log.error(f"   ❌ Status check failed: {response.status}")
                     return False
-                
-                time.sleep(2)
-            else:
-                print(f"   ❌ Status check failed: {response.status_code}")
+            except Exception as e:
+                log.error(f"   ❌ Status check error: {e}")
                 return False
-        except Exception as e:
-            print(f"   ❌ Status check error: {e}")
-            return False
+    finally:
+        conn.close()
     
-    print(f"   ⚠️  Processing timeout after {max_wait} seconds")
+    log.warning(f"   ⚠️  Processing timeout after {max_wait} seconds")
     return False
 
-def test_document_retrieval(doc_id):
+def test_document_retrieval(state):
     """Test retrieving document details"""
-    print(f"\n4. Testing document retrieval (ID: {doc_id})...")
+    doc_id = state.doc_id
+    log.info(f"\n4. Testing document retrieval (ID: {doc_id})...")
     
     try:
-        response = requests.get(f"{BACKEND_URL}/documents/{doc_id}")
+        response = SESSION.get(f"{BACKEND_URL}/documents/{doc_id}")
         if response.status_code == 200:
             data = response.json()
+            # The document must agree with the final status seen while processing
+            final_status = (state.status_response or {}).get('status')
+            if final_status and data['status'] != final_status:
+                log.error(f"   ❌ Retrieved status {data['status']} does not match final status {final_status}")
+                return False
             content = data.get('content_preview', '')
-            print(f"   ✅ Document retrieved successfully")
-            print(f"   - Content length: {len(content)} characters")
+            log.info(f"   ✅ Document retrieved successfully")
+            log.info(f"   - Content length: {len(content)} characters")
             if content:
-                print(f"   - Preview: {content[:100]}...")
+                log.info(f"   - Preview: {content[:100]}...")
             return True
         else:
-            print(f"   ❌ Retrieval failed: {response.status_code}")
+            log.error(f"   ❌ Retrieval failed: {response.status_code}")
             return False
     except Exception as e:
-        print(f"   ❌ Retrieval error: {e}")
+        log.error(f"   ❌ Retrieval error: {e}")
         return False
 
 def test_rag_query():
     """Test RAG query endpoint"""
-    print("\n5. Testing RAG query endpoint...")
+    log.info("\n5. Testing RAG query endpoint...")
     
     try:
         payload = {
             "query": "What are the main features of this system?",
             "top_k": 3
         }
-        response = requests.post(
+        body = orjson.dumps(payload) if ORJSON_AVAILABLE else json.dumps(payload).encode('utf-8')
+        response = SESSION.post(
             f"{BACKEND_URL}/process",
-            json=payload,
+            data=body,
             headers={"Content-Type": "application/json"}
         )
         
         if response.status_code == 200:
-            data = response.json()
-            print(f"   ✅ RAG query successful")
-            print(f"   - Query: {data['query']}")
-            print(f"   - Chunks retrieved: {len(data['relevant_chunks'])}")
-            print(f"   - Response preview: {data['response'][:150]}...")
+            data = orjson.loads(response.content) if ORJSON_AVAILABLE else response.json()
+            log.info(f"   ✅ RAG query successful")
+            log.info(f"   - Query: {data['query']}")
+            log.info(f"   - Chunks retrieved: {len(data['relevant_chunks'])}")
+            log.info(f"   - Response preview: {data['response'][:150]}...")
             return True
         else:
-            print(f"   ❌ Query failed: {response.status_code}")
-            print(f"   - Response: {response.text}")
+            log.error(f"   ❌ Query failed: {response.status_code}")
+            log.info(f"   - Response: {response.text}")
             return False
     except Exception as e:
-        print(f"   ❌ Query error: {e}")
+        log.error(f"   ❌ Query error: {e}")
         return False
 
 def test_grok_api_integration():
     """Test GROK API integration"""
-    print("\n6. Testing GROK API integration...")
+    log.info("\n6. Testing GROK API integration...")
     
     grok_key = os.getenv('GROK_API_KEY', 'not_set')
     
     if grok_key == 'not_set' or grok_key == 'your_grok_api_key_here':
-        print("   ⚠️  GROK_API_KEY not configured - LLM features disabled")
-        print("   - To enable: Set GROK_API_KEY in .env file")
-        print("   - Get key from: https://console.x.ai/")
+        log.warning("   ⚠️  GROK_API_KEY not configured - LLM features disabled")
+        log.info("   - To enable: Set GROK_API_KEY in .env file")
+        log.info("   - Get key from: https://console.x.ai/")
         return False
     else:
-        print("   ✅ GROK_API_KEY is configured")
-        print("   - Note: Actual API calls require valid key and network access")
+        log.info("   ✅ GROK_API_KEY is configured")
+        log.info("   - Note: Actual API calls require valid key and network access")
         return True
 
 def main():
-    print("=" * 70)
-    print("DARTOS FILE UPLOAD PIPELINE - COMPREHENSIVE TEST")
-    print("=" * 70)
+    log.info("=" * 70)
+    log.info("DARTOS FILE UPLOAD PIPELINE - COMPREHENSIVE TEST")
+    log.info("=" * 70)
     
     results = []
     
     # Test 1: Backend health
     results.append(("Backend Health", test_backend_health()))
+    _buffer.flush()
     
     if not results[0][1]:
-        print("\n❌ Backend is not running. Please start it first:")
-        print("   cd backend && uvicorn main:app --reload")
+        log.error("\n❌ Backend is not running. Please start it first:")
+        log.info("   cd backend && uvicorn main:app --reload")
+        _buffer.flush()
         return
     
-    # Test 2: File upload
-    doc_id = test_file_upload()
-    results.append(("File Upload", doc_id is not None))
-    
-    if doc_id:
-        # Test 3: Document processing
-        results.append(("Document Processing", test_document_processing(doc_id)))
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        # Tests 5 and 6 don't depend on the uploaded document, so they run
+        # while the upload -> processing -> retrieval chain waits on the backend
+        rag_future = pool.submit(test_rag_query)
+        grok_future = pool.submit(test_grok_api_integration)
         
-        # Test 4: Document retrieval
-        results.append(("Document Retrieval", test_document_retrieval(doc_id)))
-    
-    # Test 5: RAG query
-    results.append(("RAG Query", test_rag_query()))
-    
-    # Test 6: GROK API
-    results.append(("GROK API Integration", test_grok_api_integration()))
+        # Test 2: File upload
+        state = PipelineState()
+        doc_id = test_file_upload(state)
+        results.append(("File Upload", doc_id is not None))
+        _buffer.flush()
+        
+        if doc_id:
+            # Test 3: Document processing
+            results.append(("Document Processing", test_document_processing(state)))
+            _buffer.flush()
+            
+            # Test 4: Document retrieval
+            results.append(("Document Retrieval", test_document_retrieval(state)))
+            _buffer.flush()
+        
+        # Test 5: RAG query
+        results.append(("RAG Query", rag_future.result()))
+        
+        # Test 6: GROK API
+        results.append(("GROK API Integration", grok_future.result()))
     
     # Summary
-    print("\n" + "=" * 70)
-    print("TEST SUMMARY")
-    print("=" * 70)
-    
-    for test_name, passed in results:
-        status = "✅ PASS" if passed else "❌ FAIL"
-        print(f"{status}: {test_name}")
+    if RICH_AVAILABLE:
+        # Rendered in a single write once the buffered progress output is out
+        table = Table(title="Dartos Pipeline Tests")
+        table.add_column("Test")
+        table.add_column("Result")
+        for test_name, passed in results:
+            table.add_row(test_name, "✅ PASS" if passed else "❌ FAIL")
+        _buffer.flush()
+        Console().print(table)
+    else:
+        log.info("\n" + "=" * 70)
+        log.info("TEST SUMMARY")
+        log.info("=" * 70)
+        
+        for test_name, passed in results:
+            status = "✅ PASS" if passed else "❌ FAIL"
+            log.info(f"{status}: {test_name}")
     
     passed_count = sum(1 for _, p in results if p)
     total_count = len(results)
     
-    print("\n" + "-" * 70)
-    print(f"Results: {passed_count}/{total_count} tests passed")
-    print("=" * 70)
+    log.info("\n" + "-" * 70)
+    log.info(f"Results: {passed_count}/{total_count} tests passed")
+    log.info("=" * 70)
     
     if passed_count == total_count:
-        print("\n🎉 All tests passed! File upload pipeline is fully functional.")
+        log.info("\n🎉 All tests passed! File upload pipeline is fully functional.")
     elif passed_count >= total_count - 1:
-        print("\n✅ Core functionality working! Minor issues detected.")
+        log.info("\n✅ Core functionality working! Minor issues detected.")
     else:
-        print("\n⚠️  Some critical tests failed. Please review the errors above.")
+        log.warning("\n⚠️  Some critical tests failed. Please review the errors above.")
+    _buffer.flush()
 
 if __name__ == "__main__":
     main()
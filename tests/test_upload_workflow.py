@@ -1,213 +1,196 @@
 #!/usr/bin/env python3
 """
 Test file upload workflow and status tracking
+
+Run with pytest; the tests are independent, so they can be spread over workers:
+    pytest tests/test_upload_workflow.py -n auto
+
+Slow tests are skipped by default; run everything with -m "slow or not slow",
+and only what failed last time with --lf.
 """
 
-import sys
+import contextlib
+import functools
+import hashlib
+import math
 import os
+import sys
 from pathlib import Path
 
-# Add the backend directory to the Python path
-backend_dir = Path(__file__).parent / "backend"
-sys.path.insert(0, str(backend_dir))
+import numpy as np
+import pytest
+try:
+    from filelock import FileLock
+    FILELOCK_AVAILABLE = True
+except ImportError:
+    FILELOCK_AVAILABLE = False
+
+# Bump when PDFProcessor's output changes so stale cached extractions are ignored
+EXTRACTOR_VERSION = 1
+
+CHUNK_TEST_TEXT = "x" * 1250
+
+SEARCH_QUERIES = [
+    "What are the main features?",
+    "How is the document stored?",
+    "Which AI services are integrated?",
+    "What does the RAG system do?"
+]
+
+@functools.cache
+def _ensure_sample_pdf(cache_dir: Path) -> Path:
+    """Create the sample PDF once in the pytest cache, without racing other xdist workers"""
+    sample_pdf = cache_dir / "sample_document.pdf"
+    lock = FileLock(f"{sample_pdf}.lock") if FILELOCK_AVAILABLE else contextlib.nullcontext()
+    with lock:
+        if not sample_pdf.exists():
+            from create_sample_pdf import create_sample_pdf
+
+            # Build under a private name and rename, so readers never see a partial file
+            tmp_path = f"{sample_pdf}.{os.getpid()}.tmp"
+            create_sample_pdf(tmp_path)
+            os.replace(tmp_path, sample_pdf)
+    return sample_pdf
+
+@functools.lru_cache(maxsize=None)
+def _extract_text_cached(pdf_path: str, digest: str, cache_dir: Path) -> str:
+    """Extract PDF text, memoized in-process and on disk by content hash"""
+    cache_path = cache_dir / f"{digest}-v{EXTRACTOR_VERSION}.txt"
+    try:
+        return cache_path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        pass
+
+    from services.pdf_processor import PDFProcessor
+    text = PDFProcessor().extract_text(pdf_path)
+
+    # Write-then-rename so concurrent workers never read a partial file
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, cache_path)
+    return text
 
 def test_schemas():
     """Test new schema additions"""
-    print("Testing schemas...")
-    try:
-        from schemas import DocumentResponse, DocumentStatus, ProcessingRequest, SummaryResponse
-        
-        # Test DocumentResponse with new fields
-        doc = DocumentResponse(
-            id=1,
-            filename="test.pdf",
-            status="processing",
-            content_preview="Test content",
-            error_message="Test error"
-        )
-        assert doc.error_message == "Test error"
-        
-        # Test DocumentStatus
-        status = DocumentStatus(
-            id=1,
-            filename="test.pdf",
-            status="processing",
-            progress="Extracting text and indexing document",
-            error_message=None
-        )
-        assert status.progress == "Extracting text and indexing document"
-        
-        print("✅ Schemas work correctly with new fields")
-        return True
-    except Exception as e:
-        print(f"❌ Schema test failed: {e}")
-        return False
+    from schemas import DocumentResponse, DocumentStatus, ProcessingRequest, SummaryResponse
+
+    # Test DocumentResponse with new fields
+    doc = DocumentResponse(
+        id=1,
+        filename="test.pdf",
+        status="processing",
+        content_preview="Test content",
+        error_message="Test error"
+    )
+    assert doc.error_message == "Test error"
+
+    # Test DocumentStatus
+    status = DocumentStatus(
+        id=1,
+        filename="test.pdf",
+        status="processing",
+        progress="Extracting text and indexing document",
+        error_message=None
+    )
+    assert status.progress == "Extracting text and indexing document"
 
 def test_document_model():
     """Test document model with new fields"""
-    print("Testing document model...")
-    try:
-        from database import Base, engine
-        from models import Document
-        
-        # Check model has new fields
-        assert hasattr(Document, 'status')
-        assert hasattr(Document, 'error_message')
-        
-        print("✅ Document model has status and error_message fields")
-        return True
-    except Exception as e:
-        print(f"❌ Document model test failed: {e}")
-        return False
+    from models import Document
+
+    # Check model has new fields
+    assert hasattr(Document, 'status')
+    assert hasattr(Document, 'error_message')
 
-def test_llm_service():
+def test_llm_service(monkeypatch):
     """Test LLM service improvements"""
-    print("Testing LLM service...")
-    try:
-        from services.llm_service import LLMService
-        
-        # Initialize without API key (graceful degradation)
-        os.environ.pop('GROK_API_KEY', None)
-        llm = LLMService()
-        
-        # Test chunk formatting
-        chunks = [
-            "This is the first chunk of text.",
-            "This is the second chunk with more information.",
-            "Third chunk contains additional details."
-        ]
-        
-        formatted = llm._format_chunks_for_context(chunks)
-        
-        # Check formatting includes section numbers
-        assert "[Context Section 1]" in formatted
-        assert "[Context Section 2]" in formatted
-        assert "[Context Section 3]" in formatted
-        assert "---" in formatted  # Check separator
-        
-        print("✅ LLM service chunk formatting works correctly")
-        return True
-    except Exception as e:
-        print(f"❌ LLM service test failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+    from services.llm_service import LLMService
+
+    # Initialize without API key (graceful degradation)
+    monkeypatch.delenv('GROK_API_KEY', raising=False)
+    llm = LLMService()
+
+    # Test chunk formatting
+    chunks = [
+        "This is the first chunk of text.",
+        "This is the second chunk with more information.",
+        "Third chunk contains additional details."
+    ]
+
+    formatted = llm._format_chunks_for_context(chunks)
 
-def test_rag_service_offline():
+    # Check formatting includes section numbers
+    assert "[Context Section 1]" in formatted
+    assert "[Context Section 2]" in formatted
+    assert "[Context Section 3]" in formatted
+    assert "---" in formatted  # Check separator
+
+def test_rag_service_offline(rag_service):
     """Test RAG service handles offline mode gracefully"""
-    print("Testing RAG service offline mode...")
-    try:
-        import tempfile
-        from services.rag_service import RAGService
-        
-        # Create a temporary directory for testing
-        with tempfile.TemporaryDirectory() as temp_dir:
-            rag = RAGService(chroma_path=temp_dir)
-            
-            # Should initialize even without embedding model
-            assert rag.client is not None
-            assert rag.collection is not None
-            
-            # Test chunking
-            test_text = "This is a test document. " * 50
-            chunks = rag.chunk_text(test_text)
-            assert len(chunks) > 0
-            
-            print("✅ RAG service works in offline mode")
-            return True
-    except Exception as e:
-        print(f"❌ RAG service test failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+    rag = rag_service
+
+    # Should initialize even without embedding model
+    assert rag.client is not None
+    assert rag.collection is not None
+
+    # Test chunking: with no sentence or paragraph breaks every chunk is a fixed-stride window
+    chunk_size, overlap = 1000, 200
+    chunks = rag.chunk_text(CHUNK_TEST_TEXT, chunk_size=chunk_size, overlap=overlap)
+    starts = np.arange(0, len(CHUNK_TEST_TEXT), chunk_size - overlap)
+    expected_lengths = np.minimum(starts + chunk_size, len(CHUNK_TEST_TEXT)) - starts
+    assert len(chunks) == math.ceil(len(CHUNK_TEST_TEXT) / (chunk_size - overlap))
+    assert np.array_equal([len(chunk) for chunk in chunks], expected_lengths)
 
-def test_end_to_end_processing():
+@pytest.mark.slow
+def test_end_to_end_processing(request, rag_service):
     """Test end-to-end document processing pipeline"""
-    print("Testing end-to-end document processing...")
+    from services.llm_service import LLMService
+
+    # Extracted text is reused across runs while the PDF is unchanged
+    cache_dir = request.config.cache.mkdir("pdf_extract")
+
+    # Create sample PDF if it doesn't exist
     try:
-        from services.pdf_processor import PDFProcessor
-        from services.rag_service import RAGService
-        from services.llm_service import LLMService
-        import tempfile
-        import os
-        
-        # Create sample PDF if it doesn't exist
-        sample_pdf = "sample_document.pdf"
-        if not os.path.exists(sample_pdf):
-            try:
-                from create_sample_pdf import create_sample_pdf
-                create_sample_pdf()
-            except (ImportError, Exception) as e:
-                print(f"⚠️ Cannot create sample PDF: {e}")
-                print("⚠️ Skipping end-to-end test - no test PDF available")
-                return False
-        
-        if not os.path.exists(sample_pdf):
-            print("⚠️ Sample PDF not available, skipping end-to-end test")
-            return False
-        
-        # Initialize services
-        pdf_processor = PDFProcessor()
-        with tempfile.TemporaryDirectory() as temp_dir:
-            rag_service = RAGService(chroma_path=temp_dir)
-            llm_service = LLMService()
-            
-            # Extract text
-            text = pdf_processor.extract_text(sample_pdf)
-            assert text and len(text) > 100, "Text extraction failed"
-            
-            # Chunk and index
-            doc_id = 999  # Test ID
-            rag_service.index_document(doc_id, text)
-            
-            # Test search
-            results = rag_service.search("What are the main features?", k=3)
-            assert len(results) > 0, "RAG search failed"
-            
-            # Test LLM response (if API key available)
-            if llm_service.client:
-                response = llm_service.generate_response(
-                    "What are the main features of this system?",
-                    results
-                )
-                assert response and len(response) > 10, "LLM response failed"
-            
-            print("✅ End-to-end processing test passed")
-            return True
-    
+        sample_pdf = _ensure_sample_pdf(cache_dir)
+        pdf_bytes = sample_pdf.read_bytes()
+    except FileNotFoundError:
+        pytest.skip("Sample PDF not available")
     except Exception as e:
-        print(f"❌ End-to-end test failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-def main():
-    print("🧪 Running File Upload Workflow Tests\n")
-    
-    tests = [
-        test_schemas,
-        test_document_model,
-        test_llm_service,
-        test_rag_service_offline,
-        test_end_to_end_processing,
-    ]
-    
-    passed = 0
-    total = len(tests)
-    
-    for test in tests:
-        if test():
-            passed += 1
-        print()
-    
-    print(f"📊 Test Results: {passed}/{total} tests passed")
-    
-    if passed == total:
-        print("🎉 All workflow tests passed!")
-        return 0
-    else:
-        print("⚠️  Some tests failed. Check the errors above.")
-        return 1
+        pytest.skip(f"Cannot create sample PDF: {e}")
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+
+    # Extract text
+    text = _extract_text_cached(str(sample_pdf), digest, cache_dir)
+    assert text and len(text) > 100, "Text extraction failed"
+
+    # Initialize services
+    llm_service = LLMService()
+
+    # Chunk and index; the store persists across runs, so only (re)index when the
+    # stored chunks are missing or came from a different PDF
+    doc_id = 999  # Test ID
+    stored_chunks = rag_service.get_document_chunks(doc_id)
+    if stored_chunks != rag_service.chunk_text(text):
+        if stored_chunks:
+            rag_service.delete_document(doc_id)
+        rag_service.index_document(doc_id, text)
+
+    # Test search
+    results = rag_service.search("What are the main features?", k=3)
+    assert len(results) > 0, "RAG search failed"
+
+    # Test batched search: one embedding pass and one collection query for all queries
+    batch_results = rag_service.search_batch(SEARCH_QUERIES, k=3)
+    assert len(batch_results) == len(SEARCH_QUERIES)
+    assert all(0 < len(chunks) <= 3 for chunks in batch_results), "RAG batch search failed"
+
+    # Test LLM response (if API key available)
+    if llm_service.client:
+        response = llm_service.generate_response(
+            "What are the main features of this system?",
+            results
+        )
+        assert response and len(response) > 10, "LLM response failed"
 
 if __name__ == "__main__":
-    sys.exit(main())
+    sys.exit(pytest.main([__file__]))